@@ -2,7 +2,12 @@ from googleapiclient.http import MediaIoBaseUpload
 import os
 import json
 import io
-from datetime import datetime
+import sys
+import bisect
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime, date
 from dotenv import load_dotenv
 
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -29,6 +34,30 @@ GDRIVE_INPUT_ID = os.getenv("GDRIVE_INPUT_ID")
 GDRIVE_PROCESSED_ID = os.getenv("GDRIVE_PROCESSED_ID")
 GDRIVE_KNOWLEDGE_ID = os.getenv("GDRIVE_KNOWLEDGE_ID")
 
+# Fonte dos JSONs: "drive" (padrão) ou "local"
+FONTE_DADOS = os.getenv("FONTE_DADOS", "drive").lower()
+PASTA_JSON_LOCAL = os.getenv("PASTA_JSON_LOCAL", "json_diarios")
+PASTA_PROCESSADOS_LOCAL = os.getenv("PASTA_PROCESSADOS_LOCAL", "json_processados")
+PASTA_CONHECIMENTO_LOCAL = os.getenv("PASTA_CONHECIMENTO_LOCAL", "conhecimento")
+
+# Arquivamento anual das abas que crescem sem parar
+ARQUIVAR_ABAS = os.getenv("ARQUIVAR_ABAS", "0") == "1"   # desligado por padrão
+ARQUIVO_CORTE = os.getenv("ARQUIVO_CORTE")                  # AAAA-MM-DD (padrão: 1º de janeiro do ano atual)
+SPREADSHEET_ARQUIVO_ID = os.getenv("SPREADSHEET_ARQUIVO_ID")  # vazio = abas de arquivo na própria planilha
+# 'log_json' fica de fora: é estreita e é a base da checagem de duplicidade
+ABAS_ARQUIVAVEIS = ("alimentacao", "hidratacao", "midias")
+
+# Motor assíncrono: workers por estágio e tamanho das filas entre estágios
+# (LIMITE_GRAVACOES > 1 grava em paralelo e abre mão da ordem cronológica nas abas)
+LIMITE_DOWNLOADS = int(os.getenv("LIMITE_DOWNLOADS", "4"))
+LIMITE_TRANSFORMACOES = int(os.getenv("LIMITE_TRANSFORMACOES", "2"))
+LIMITE_GRAVACOES = int(os.getenv("LIMITE_GRAVACOES", "1"))
+TAMANHO_FILA = int(os.getenv("TAMANHO_FILA", "8"))
+
+# Cache local dos JSONs baixados do Drive (0 MB = desligado)
+CACHE_DRIVE_DIR = os.getenv("CACHE_DRIVE_DIR", ".cache_drive")
+CACHE_DRIVE_MAX_MB = int(os.getenv("CACHE_DRIVE_MAX_MB", "200"))
+
 # =========================
 # AUTH
 # =========================
@@ -57,20 +86,35 @@ def get_google_services():
 # FUNÇÕES DO DRIVE (CLOUD)
 # =========================
 
+def iter_json_pages_in_drive(service, folder_id, page_size=1000):
+    """Percorre a listagem de JSONs da pasta, uma página por vez."""
+    query = f"'{folder_id}' in parents and mimeType='application/json' and trashed=false"
+    page_token = None
+
+    while True:
+        results = service.files().list(
+            q=query,
+            fields="nextPageToken, files(id, name, createdTime, md5Checksum)",
+            orderBy="createdTime",
+            pageSize=page_size,
+            pageToken=page_token
+        ).execute()
+
+        yield results.get("files", [])
+
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+
 def list_json_files_in_drive(service, folder_id):
     """Lista arquivos JSON dentro de uma pasta específica do Drive."""
-    query = f"'{folder_id}' in parents and mimeType='application/json' and trashed=false"
-    
-    results = service.files().list(
-        q=query,
-        fields="files(id, name, createdTime)",
-        orderBy="createdTime"
-    ).execute()
-    
-    return results.get("files", [])
+    files = []
+    for page in iter_json_pages_in_drive(service, folder_id):
+        files.extend(page)
+    return files
 
-def read_json_from_drive(service, file_id):
-    """Baixa o conteúdo do JSON para a memória."""
+def download_bytes_from_drive(service, file_id):
+    """Baixa o conteúdo bruto do arquivo para a memória."""
     request = service.files().get_media(fileId=file_id)
     fh = io.BytesIO()
     downloader = MediaIoBaseDownload(fh, request)
@@ -79,11 +123,115 @@ def read_json_from_drive(service, file_id):
     while not done:
         status, done = downloader.next_chunk()
     
-    # Retorna o cursor para o início e lê
-    fh.seek(0)
-    content = fh.read().decode('utf-8')
+    return fh.getvalue()
+
+def read_json_from_drive(service, file_id):
+    """Baixa o conteúdo do JSON para a memória."""
+    content = download_bytes_from_drive(service, file_id).decode('utf-8')
     return json.loads(content)
 
+# =========================
+# CACHE LOCAL DOS DOWNLOADS
+# =========================
+
+class CacheDrive:
+    """Cache em disco dos JSONs do Drive, com descarte LRU por tamanho.
+
+    A chave é (ID do arquivo, md5Checksum): se o arquivo mudar no Drive o
+    md5 muda e a versão antiga é substituída. Cada entrada é um arquivo
+    `<id>_<md5>.json`; o mtime marca o último uso, então a ordem LRU
+    sobrevive entre execuções.
+    """
+
+    def __init__(self, pasta, limite_bytes):
+        self.pasta = pasta
+        self.limite_bytes = limite_bytes
+        self._entradas = OrderedDict()  # file_id -> (md5, tamanho), do menos para o mais recente
+        self._total = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(pasta, exist_ok=True)
+        existentes = []
+        with os.scandir(pasta) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    # Sobra de uma gravação interrompida
+                    self._apagar(entry.path)
+                    continue
+                if not entry.name.endswith(".json") or "_" not in entry.name:
+                    continue
+                file_id, md5 = entry.name[:-5].rsplit("_", 1)
+                st = entry.stat()
+                existentes.append((st.st_mtime_ns, file_id, md5, st.st_size))
+
+        # Do mais antigo para o mais novo; se um ID aparecer duas vezes, fica só o mais novo
+        for _, file_id, md5, tamanho in sorted(existentes):
+            if file_id in self._entradas:
+                self._descartar(file_id)
+            self._entradas[file_id] = (md5, tamanho)
+            self._total += tamanho
+
+        # O limite pode ter diminuído desde a última execução
+        self._limitar()
+
+    def _caminho(self, file_id, md5):
+        return os.path.join(self.pasta, f"{file_id}_{md5}.json")
+
+    @staticmethod
+    def _apagar(caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+    def _descartar(self, file_id):
+        md5, tamanho = self._entradas.pop(file_id)
+        self._total -= tamanho
+        self._apagar(self._caminho(file_id, md5))
+
+    def _limitar(self):
+        """Descarta as entradas menos usadas até o total caber no limite."""
+        while self._total > self.limite_bytes:
+            self._descartar(next(iter(self._entradas)))
+
+    def obter(self, file_id, md5):
+        """Retorna o conteúdo bruto em cache, ou None se não houver/estiver desatualizado."""
+        with self._lock:
+            if self._entradas.get(file_id, (None,))[0] != md5:
+                return None
+            caminho = self._caminho(file_id, md5)
+            try:
+                with open(caminho, "rb") as f:
+                    conteudo = f.read()
+                os.utime(caminho)
+            except OSError as e:
+                if not isinstance(e, FileNotFoundError):
+                    print(f"   [AVISO] Cache ilegível para {file_id} ({e}); baixando do Drive.")
+                self._descartar(file_id)
+                return None
+            self._entradas.move_to_end(file_id)
+            return conteudo
+
+    def guardar(self, file_id, md5, conteudo):
+        """Grava o conteúdo e descarta as entradas menos usadas acima do limite."""
+        if len(conteudo) > self.limite_bytes:
+            return
+        with self._lock:
+            if file_id in self._entradas:
+                self._descartar(file_id)
+            caminho = self._caminho(file_id, md5)
+            temporario = caminho + ".tmp"
+            try:
+                with open(temporario, "wb") as f:
+                    f.write(conteudo)
+                os.replace(temporario, caminho)
+            except OSError:
+                self._apagar(temporario)
+                raise
+            self._entradas[file_id] = (md5, len(conteudo))
+            self._total += len(conteudo)
+            self._limitar()
+
 def move_file_in_drive(service, file_id, old_folder_id, new_folder_id):
     """Move o arquivo trocando o ID da pasta pai."""
     service.files().update(
@@ -93,6 +241,227 @@ def move_file_in_drive(service, file_id, old_folder_id, new_folder_id):
         fields="id, parents"
     ).execute()
 
+# =========================
+# FONTES DE ENTRADA (DRIVE / LOCAL)
+# =========================
+# Toda fonte expõe a mesma interface usada pelo main:
+#   listar()                          -> lista de dicts {id, name, createdTime}
+#   paginas()                         -> a mesma listagem, página a página
+#   ler(arquivo)                      -> conteúdo JSON já decodificado
+#   mover(arquivo)                    -> tira o arquivo da entrada (vai para processados)
+#   salvar_texto(nome, conteudo)      -> grava/sobrescreve o TXT de contexto
+
+class FonteDrive:
+    """Lê os JSONs de uma pasta do Google Drive.
+
+    O cliente do Drive (httplib2) não é thread-safe; com `creds` informado,
+    cada thread do motor assíncrono ganha o seu próprio service. Com `cache`,
+    arquivos que não mudaram (mesmo md5Checksum) são lidos do disco.
+    """
+
+    def __init__(self, service, pasta_entrada, pasta_processados, pasta_conhecimento, creds=None, cache=None):
+        self.service = service
+        self.pasta_entrada = pasta_entrada
+        self.pasta_processados = pasta_processados
+        self.pasta_conhecimento = pasta_conhecimento
+        self._creds = creds
+        self._cache = cache
+        self._local = threading.local()
+
+    def _service(self):
+        if self._creds is None or threading.current_thread() is threading.main_thread():
+            return self.service
+        if not hasattr(self._local, "service"):
+            self._local.service = build("drive", "v3", credentials=self._creds)
+        return self._local.service
+
+    def listar(self):
+        return list_json_files_in_drive(self._service(), self.pasta_entrada)
+
+    def paginas(self):
+        return iter_json_pages_in_drive(self._service(), self.pasta_entrada)
+
+    def ler(self, arquivo):
+        md5 = arquivo.get("md5Checksum")
+        if self._cache is None or not md5:
+            return read_json_from_drive(self._service(), arquivo["id"])
+
+        # O cache é só otimização: qualquer falha nele cai no download normal
+        conteudo = self._cache.obter(arquivo["id"], md5)
+        if conteudo is not None:
+            try:
+                return json.loads(conteudo.decode('utf-8'))
+            except ValueError:
+                print(f"   [AVISO] Cache corrompido para {arquivo['name']}; baixando do Drive.")
+
+        conteudo = download_bytes_from_drive(self._service(), arquivo["id"])
+        data = json.loads(conteudo.decode('utf-8'))  # só guarda se for JSON válido
+        try:
+            self._cache.guardar(arquivo["id"], md5, conteudo)
+        except OSError as e:
+            print(f"   [AVISO] Não foi possível gravar {arquivo['name']} no cache ({e}).")
+        return data
+
+    def mover(self, arquivo):
+        move_file_in_drive(self._service(), arquivo["id"], self.pasta_entrada, self.pasta_processados)
+
+    def salvar_texto(self, file_name, content_str):
+        # Verifica se o arquivo já existe para sobrescrever
+        query = f"name = '{file_name}' and '{self.pasta_conhecimento}' in parents and trashed = false"
+        existing_files = self.service.files().list(q=query).execute().get('files', [])
+
+        media = MediaIoBaseUpload(io.BytesIO(content_str.encode('utf-8')), mimetype='text/plain')
+
+        if existing_files:
+            # Atualiza o existente
+            file_id = existing_files[0]['id']
+            self.service.files().update(fileId=file_id, media_body=media).execute()
+            print(f" -> Arquivo '{file_name}' ATUALIZADO com sucesso.")
+        else:
+            # Cria um novo
+            file_metadata = {'name': file_name, 'parents': [self.pasta_conhecimento]}
+            self.service.files().create(body=file_metadata, media_body=media).execute()
+            print(f" -> Arquivo '{file_name}' CRIADO com sucesso.")
+
+
+class FonteLocal:
+    """Lê os JSONs de uma pasta local, mantendo um índice ordenado por data.
+
+    Só entram no índice os arquivos no padrão `dados_AAAA-MM-DD.json` e
+    `analise_AAAA-MM-DD.json`. O índice é atualizado de forma incremental:
+    a pasta só é varrida de novo quando o mtime dela muda, e apenas os nomes
+    novos têm a data interpretada.
+    """
+
+    PREFIXOS = ("dados_", "analise_")
+
+    def __init__(self, pasta_entrada, pasta_processados=None, pasta_conhecimento=None):
+        self.pasta_entrada = pasta_entrada
+        self.pasta_processados = pasta_processados
+        self.pasta_conhecimento = pasta_conhecimento
+        self._indice = []     # lista ordenada de (data, nome)
+        self._nomes = {}      # nome -> data, para achar a entrada no índice
+        self._mtime = None
+        self._lock = threading.RLock()  # o motor assíncrono lista e move em threads
+
+    @classmethod
+    def _data_do_nome(cls, nome):
+        """Extrai a data do nome do arquivo, ou None se não seguir o padrão."""
+        if not nome.endswith(".json"):
+            return None
+        for prefixo in cls.PREFIXOS:
+            if nome.startswith(prefixo):
+                try:
+                    return datetime.strptime(nome[len(prefixo):-5], "%Y-%m-%d").date()
+                except ValueError:
+                    return None
+        return None
+
+    def _adicionar(self, nome, data):
+        self._nomes[nome] = data
+        bisect.insort(self._indice, (data, nome))
+
+    def _remover(self, nome):
+        data = self._nomes.pop(nome, None)
+        if data is None:
+            return
+        pos = bisect.bisect_left(self._indice, (data, nome))
+        if pos < len(self._indice) and self._indice[pos] == (data, nome):
+            del self._indice[pos]
+
+    def atualizar(self):
+        """Sincroniza o índice com a pasta (não faz nada se ela não mudou)."""
+        with self._lock:
+            self._atualizar()
+
+    def _atualizar(self):
+        try:
+            mtime = os.stat(self.pasta_entrada).st_mtime_ns
+        except FileNotFoundError:
+            self._indice, self._nomes, self._mtime = [], {}, None
+            return
+        if mtime == self._mtime:
+            return
+
+        vistos = set()
+        with os.scandir(self.pasta_entrada) as it:
+            for entry in it:
+                nome = entry.name
+                if nome in self._nomes:
+                    vistos.add(nome)
+                    continue
+                data = self._data_do_nome(nome)
+                if data is not None and entry.is_file():
+                    self._adicionar(nome, data)
+                    vistos.add(nome)
+
+        for nome in [n for n in self._nomes if n not in vistos]:
+            self._remover(nome)
+        self._mtime = mtime
+
+    def _arquivo(self, data, nome):
+        caminho = os.path.join(self.pasta_entrada, nome)
+        return {"id": nome, "name": nome, "createdTime": data.isoformat(), "path": caminho}
+
+    def listar(self):
+        with self._lock:
+            self._atualizar()
+            return [self._arquivo(d, n) for d, n in self._indice]
+
+    def paginas(self):
+        yield self.listar()
+
+    def mais_recente(self, prefixo=None):
+        """Retorna o arquivo de data mais recente (opcionalmente filtrando o prefixo)."""
+        with self._lock:
+            self._atualizar()
+            for data, nome in reversed(self._indice):
+                if prefixo is None or nome.startswith(prefixo):
+                    return self._arquivo(data, nome)
+        raise FileNotFoundError(f"Nenhum arquivo {prefixo or 'dados_/analise_'}*.json encontrado")
+
+    def intervalo(self, inicio, fim):
+        """Arquivos com data entre `inicio` e `fim` (datas inclusivas, objetos date)."""
+        with self._lock:
+            self._atualizar()
+            ini = bisect.bisect_left(self._indice, (inicio, ""))
+            fim_pos = bisect.bisect_left(self._indice, (fim, "\uffff"))
+            return [self._arquivo(d, n) for d, n in self._indice[ini:fim_pos]]
+
+    def ler(self, arquivo):
+        with open(arquivo["path"], "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def mover(self, arquivo):
+        if not self.pasta_processados:
+            return
+        os.makedirs(self.pasta_processados, exist_ok=True)
+        with self._lock:
+            os.replace(arquivo["path"], os.path.join(self.pasta_processados, arquivo["name"]))
+            # O índice já fica certo aqui; o mtime não é atualizado de propósito, para
+            # que a próxima consulta ainda enxergue arquivos criados por outros processos.
+            self._remover(arquivo["name"])
+
+    def salvar_texto(self, file_name, content_str):
+        pasta = self.pasta_conhecimento or self.pasta_entrada
+        os.makedirs(pasta, exist_ok=True)
+        with open(os.path.join(pasta, file_name), "w", encoding="utf-8") as f:
+            f.write(content_str)
+        print(f" -> Arquivo '{file_name}' salvo em '{pasta}'.")
+
+
+def criar_fonte(drive_service, creds=None):
+    """Monta a fonte de entrada configurada em FONTE_DADOS."""
+    if FONTE_DADOS == "local":
+        return FonteLocal(PASTA_JSON_LOCAL, PASTA_PROCESSADOS_LOCAL, PASTA_CONHECIMENTO_LOCAL)
+    cache = None
+    if CACHE_DRIVE_MAX_MB > 0:
+        try:
+            cache = CacheDrive(CACHE_DRIVE_DIR, CACHE_DRIVE_MAX_MB * 1024 * 1024)
+        except OSError as e:
+            print(f"Aviso: Cache local desativado ({e}).")
+    return FonteDrive(drive_service, GDRIVE_INPUT_ID, GDRIVE_PROCESSED_ID, GDRIVE_KNOWLEDGE_ID, creds, cache)
+
 # =========================
 # PROCESSAMENTO (Igual ao anterior)
 # =========================
@@ -101,9 +470,75 @@ def safe_get(data_dict, key, default=""):
     val = data_dict.get(key)
     return val if val is not None else default
 
+def _intern(val):
+    """Compartilha strings repetidas (datas, horários, itens) entre as linhas."""
+    return sys.intern(val) if isinstance(val, str) else val
+
+# --- Linhas tipadas ---
+# Cada aba tem uma classe com __slots__ (os campos, na ordem das colunas).
+# Ocupam menos memória que uma lista por linha nos backfills grandes e só
+# viram listas no momento do envio para o Sheets (ver gravar_linhas).
+
+class Linha:
+    __slots__ = ()
+
+    def __init__(self, *valores):
+        if len(valores) != len(self.__slots__):
+            raise TypeError(
+                f"{type(self).__name__} espera {len(self.__slots__)} valores, recebeu {len(valores)}"
+            )
+        for campo, valor in zip(self.__slots__, valores):
+            setattr(self, campo, valor)
+
+    def __iter__(self):
+        for campo in self.__slots__:
+            yield getattr(self, campo)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return f"{type(self).__name__}{tuple(self)!r}"
+
+class LinhaAlimentacao(Linha):
+    __slots__ = ("data", "horario", "item", "quantidade", "midia_id", "json_filename")
+
+class LinhaHidratacao(Linha):
+    __slots__ = ("data", "horario", "item", "quantidade", "midia_id", "json_filename")
+
+class LinhaExercicio(Linha):
+    __slots__ = ("data", "tipo", "duracao_min", "intensidade", "calorias_estimadas", "midia_id", "json_filename")
+
+class LinhaPeso(Linha):
+    __slots__ = ("data", "horario", "valor_kg", "json_filename")
+
+class LinhaSono(Linha):
+    __slots__ = ("data", "inicio", "fim", "duracao_minutos", "sono_profundo_min", "sono_leve_min",
+                 "sono_rem_min", "acordado_min", "midia_id", "json_filename")
+
+class LinhaAnalise(Linha):
+    __slots__ = ("data", "evento_tipo", "evento_referencia", "resumo", "pontos_positivos",
+                 "pontos_atencao", "sugestoes", "json_filename")
+
+class LinhaMidia(Linha):
+    __slots__ = ("data", "tipo_evento", "origem", "descricao", "url_imagem", "midia_id", "json_filename")
+
+def _valores(rows):
+    """Converte as linhas tipadas em listas (formato aceito pelo gspread)."""
+    return [list(r) for r in rows]
+
 def process_health_data(spreadsheet, data, filename):
-    
+    """Monta as linhas do JSON e grava na planilha (caminho síncrono)."""
+    gravar_linhas(spreadsheet, montar_linhas(data, filename))
+
+def montar_linhas(data, filename):
+    """Converte o JSON diário em {aba: linhas}, sem tocar na planilha."""
+    linhas = {}
     media_rows = [] # Lista para acumular registros para a aba 'midias'
+    filename = sys.intern(filename)
     
     # === BLOCO DE COMPATIBILIDADE (JANEIRO/LEGADO) ===
     # Transforma "consumo_liquidos" antigo no novo formato de lista "hidratacao"
@@ -136,22 +571,22 @@ def process_health_data(spreadsheet, data, filename):
         rows = []
         for item in data["alimentacao"]:
             m_id = safe_get(item, "midia_id")
-            item_nome = safe_get(item, "item")
-            item_data = safe_get(item, "data")
+            item_nome = _intern(safe_get(item, "item"))
+            item_data = _intern(safe_get(item, "data"))
             
-            rows.append([
+            rows.append(LinhaAlimentacao(
                 item_data,
-                safe_get(item, "horario"),
+                _intern(safe_get(item, "horario")),
                 item_nome,
                 safe_get(item, "quantidade_estimada", "N/A"), # Mapeia para col 'quantidade'
                 m_id,
                 filename
-            ])
+            ))
             
             # Coleta Mídia
             if m_id:
                 # Estrutura 'midias': data|tipo_evento|origem|descricao|url_imagem|midia_id|json_filename
-                media_rows.append([
+                media_rows.append(LinhaMidia(
                     item_data, 
                     "Alimentacao", 
                     "Chat", 
@@ -159,11 +594,9 @@ def process_health_data(spreadsheet, data, filename):
                     "", 
                     m_id, 
                     filename
-                ])
+                ))
                 
-        if rows:
-            spreadsheet.worksheet("alimentacao").append_rows(rows)
-            print(f"   -> {len(rows)} itens de alimentação.")
+        linhas["alimentacao"] = rows
 
     # 2. HIDRATAÇÃO
     # Colunas: data|horario|item|quantidade|midia_id|json_filename
@@ -171,20 +604,20 @@ def process_health_data(spreadsheet, data, filename):
         rows = []
         for item in data["hidratacao"]:
             m_id = safe_get(item, "midia_id")
-            item_nome = safe_get(item, "item")
-            item_data = safe_get(item, "data")
+            item_nome = _intern(safe_get(item, "item"))
+            item_data = _intern(safe_get(item, "data"))
             
-            rows.append([
+            rows.append(LinhaHidratacao(
                 item_data,
-                safe_get(item, "horario"),
+                _intern(safe_get(item, "horario")),
                 item_nome,
                 safe_get(item, "quantidade_ml", 0), # Mapeia para col 'quantidade'
                 m_id,
                 filename
-            ])
+            ))
             
             if m_id:
-                 media_rows.append([
+                 media_rows.append(LinhaMidia(
                     item_data, 
                     "Hidratacao", 
                     "Chat", 
@@ -192,14 +625,9 @@ def process_health_data(spreadsheet, data, filename):
                     "", 
                     m_id, 
                     filename
-                ])
+                ))
 
-        if rows:
-            try:
-                spreadsheet.worksheet("hidratacao").append_rows(rows)
-                print(f"   -> {len(rows)} registros de hidratação.")
-            except:
-                print("   [ERRO] Aba 'hidratacao' não encontrada.")
+        linhas["hidratacao"] = rows
 
     # 3. EXERCÍCIOS
     # Colunas: data|tipo|duracao_min|intensidade|calorias_estimadas|midia_id|json_filename
@@ -207,10 +635,10 @@ def process_health_data(spreadsheet, data, filename):
         rows = []
         for item in data["exercicios"]:
             m_id = safe_get(item, "midia_id")
-            item_nome = safe_get(item, "tipo")
-            item_data = safe_get(item, "data")
+            item_nome = _intern(safe_get(item, "tipo"))
+            item_data = _intern(safe_get(item, "data"))
 
-            rows.append([
+            rows.append(LinhaExercicio(
                 item_data,
                 item_nome,
                 safe_get(item, "duracao_min", 0),
@@ -218,10 +646,10 @@ def process_health_data(spreadsheet, data, filename):
                 safe_get(item, "calorias_estimadas", 0),
                 m_id,
                 filename
-            ])
+            ))
             
             if m_id:
-                media_rows.append([
+                media_rows.append(LinhaMidia(
                     item_data, 
                     "Exercicio", 
                     "Chat", 
@@ -229,11 +657,9 @@ def process_health_data(spreadsheet, data, filename):
                     "", 
                     m_id, 
                     filename
-                ])
+                ))
 
-        if rows:
-            spreadsheet.worksheet("exercicios").append_rows(rows)
-            print(f"   -> {len(rows)} exercícios.")
+        linhas["exercicios"] = rows
 
     # 4. PESO
     # Colunas: data|horario|valor_kg|json_filename
@@ -242,19 +668,19 @@ def process_health_data(spreadsheet, data, filename):
         if p.get("valor_kg"):
             # Nota: Peso na planilha não tem coluna de midia_id, mas capturamos para a aba midias se houver
             m_id = safe_get(p, "midia_id")
-            p_data = safe_get(p, "data")
+            p_data = _intern(safe_get(p, "data"))
             p_valor = p.get("valor_kg", 0.0)
 
-            row = [
+            row = LinhaPeso(
                 p_data,
-                safe_get(p, "horario"),
+                _intern(safe_get(p, "horario")),
                 p_valor,
                 filename
-            ]
-            spreadsheet.worksheet("peso").append_row(row)
+            )
+            linhas["peso"] = [row]
             
             if m_id:
-                media_rows.append([
+                media_rows.append(LinhaMidia(
                     p_data, 
                     "Peso", 
                     "Chat", 
@@ -262,8 +688,7 @@ def process_health_data(spreadsheet, data, filename):
                     "", 
                     m_id, 
                     filename
-                ])
-            print("   -> Peso registrado.")
+                ))
 
     # 5. SONO
     # Colunas: data|inicio|fim|duracao_minutos|sono_profundo_min|sono_leve_min|sono_rem_min|acordado_min|midia_id|json_filename
@@ -271,9 +696,9 @@ def process_health_data(spreadsheet, data, filename):
         s = data["sono"]
         if s.get("duracao_minutos") or s.get("inicio"):
             m_id = safe_get(s, "midia_id")
-            s_data = safe_get(s, "data")
+            s_data = _intern(safe_get(s, "data"))
 
-            row = [
+            row = LinhaSono(
                 s_data,
                 safe_get(s, "inicio"),
                 safe_get(s, "fim"),
@@ -284,11 +709,11 @@ def process_health_data(spreadsheet, data, filename):
                 safe_get(s, "acordado_min", 0),
                 m_id,
                 filename
-            ]
-            spreadsheet.worksheet("sono").append_row(row)
+            )
+            linhas["sono"] = [row]
             
             if m_id:
-                media_rows.append([
+                media_rows.append(LinhaMidia(
                     s_data, 
                     "Sono", 
                     "Chat", 
@@ -296,15 +721,14 @@ def process_health_data(spreadsheet, data, filename):
                     "", 
                     m_id, 
                     filename
-                ])
-            print("   -> Sono registrado.")
+                ))
 
     # 6. ANÁLISES
     # Colunas: data|evento_tipo|evento_referencia|resumo|pontos_positivos|pontos_atencao|sugestoes|json_filename
     if "analises" in data and isinstance(data["analises"], list):
         rows = []
         for a in data["analises"]:
-            rows.append([
+            rows.append(LinhaAnalise(
                 safe_get(a, "data"),
                 safe_get(a, "evento_tipo"),
                 safe_get(a, "evento_referencia"),
@@ -313,22 +737,67 @@ def process_health_data(spreadsheet, data, filename):
                 safe_get(a, "pontos_atencao"),
                 safe_get(a, "sugestoes"),
                 filename
-            ])
-        if rows:
-            spreadsheet.worksheet("analise").append_rows(rows)
-            print(f"   -> {len(rows)} análises.")
+            ))
+        linhas["analise"] = rows
 
-    # === 7. GRAVAÇÃO NA ABA MIDIAS ===
+    # === 7. ABA MIDIAS ===
     # Colunas: data|tipo_evento|origem|descricao|url_imagem|midia_id|json_filename
     if media_rows:
+        # Ordena por Data (no lugar; estável, mantém a ordem de coleta no mesmo dia)
+        media_rows.sort(key=lambda x: x.data)
+        # Remove duplicatas exatas para evitar sujeira, compactando a própria lista
+        vistos = set()
+        n = 0
+        for row in media_rows:
+            if row not in vistos:
+                vistos.add(row)
+                media_rows[n] = row
+                n += 1
+        del media_rows[n:]
+        linhas["midias"] = media_rows
+
+    return linhas
+
+def gravar_linhas(spreadsheet, linhas):
+    """Envia para a planilha as linhas montadas por montar_linhas."""
+    rows = linhas.get("alimentacao")
+    if rows:
+        spreadsheet.worksheet("alimentacao").append_rows(_valores(rows))
+        print(f"   -> {len(rows)} itens de alimentação.")
+
+    rows = linhas.get("hidratacao")
+    if rows:
         try:
-            # Remove duplicatas exatas para evitar sujeira
-            unique_media = list(set(tuple(x) for x in media_rows))
-            # Ordena por Data
-            unique_media.sort(key=lambda x: x[0])
-            
-            spreadsheet.worksheet("midias").append_rows(unique_media)
-            print(f"   -> {len(unique_media)} registros na aba 'midias'.")
+            spreadsheet.worksheet("hidratacao").append_rows(_valores(rows))
+            print(f"   -> {len(rows)} registros de hidratação.")
+        except:
+            print("   [ERRO] Aba 'hidratacao' não encontrada.")
+
+    rows = linhas.get("exercicios")
+    if rows:
+        spreadsheet.worksheet("exercicios").append_rows(_valores(rows))
+        print(f"   -> {len(rows)} exercícios.")
+
+    rows = linhas.get("peso")
+    if rows:
+        spreadsheet.worksheet("peso").append_row(list(rows[0]))
+        print("   -> Peso registrado.")
+
+    rows = linhas.get("sono")
+    if rows:
+        spreadsheet.worksheet("sono").append_row(list(rows[0]))
+        print("   -> Sono registrado.")
+
+    rows = linhas.get("analise")
+    if rows:
+        spreadsheet.worksheet("analise").append_rows(_valores(rows))
+        print(f"   -> {len(rows)} análises.")
+
+    rows = linhas.get("midias")
+    if rows:
+        try:
+            spreadsheet.worksheet("midias").append_rows(_valores(rows))
+            print(f"   -> {len(rows)} registros na aba 'midias'.")
         except gspread.exceptions.WorksheetNotFound:
             print("   [ERRO] Aba 'midias' não encontrada.")
 
@@ -346,7 +815,102 @@ def get_processed_ids(spreadsheet):
         print(f"Aviso: Não foi possível ler o log ({e}). Processando tudo.")
         return set()
 
-def generate_history_report(spreadsheet, drive_service, folder_id):
+# =========================
+# ARQUIVAMENTO (ROLLOVER ANUAL)
+# =========================
+
+def _data_da_celula(valor):
+    """Interpreta a coluna A (AAAA-MM-DD...) como date; None se não for data."""
+    try:
+        return datetime.strptime(str(valor)[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+def _aba_de_arquivo(destino, titulo, cabecalho, colunas):
+    """Abre (ou cria, com o cabeçalho se houver) a aba de arquivo no destino."""
+    try:
+        return destino.worksheet(titulo)
+    except gspread.exceptions.WorksheetNotFound:
+        ws = destino.add_worksheet(title=titulo, rows=1, cols=max(colunas, 1))
+        if cabecalho:
+            ws.update(values=[cabecalho], range_name="A1")
+        return ws
+
+def arquivar_abas_antigas(spreadsheet, corte=None, destino=None, abas=ABAS_ARQUIVAVEIS):
+    """Move as linhas com data anterior a `corte` para abas `<aba>_<ano>`.
+
+    As linhas vão para `destino` (outra planilha) ou, se não informado, para a
+    própria planilha. Tudo é feito em operações de intervalo: uma leitura da
+    coluna A para saber se há o que arquivar, uma leitura completa, um
+    append por ano e uma única exclusão de linhas (atômica) na aba original.
+    As linhas mantidas não são reescritas, então fórmulas e edições feitas na
+    planilha continuam intactas. A cópia para o arquivo acontece antes da
+    exclusão: uma falha no meio do caminho nunca perde linhas (no pior caso
+    elas ficam duplicadas no arquivo).
+    """
+    corte = corte or date(date.today().year, 1, 1)
+    destino = destino or spreadsheet
+    render = gspread.utils.ValueRenderOption.unformatted
+    raw = gspread.utils.ValueInputOption.raw
+
+    for aba in abas:
+        try:
+            ws = spreadsheet.worksheet(aba)
+        except gspread.exceptions.WorksheetNotFound:
+            continue
+
+        # Checagem barata: só a coluna de data
+        datas = ws.col_values(1, value_render_option=render)
+        if not any((d := _data_da_celula(v)) is not None and d < corte for v in datas):
+            continue
+
+        valores = ws.get_all_values(value_render_option=render)
+        # A linha 1 só é cabeçalho se não for um registro com data
+        if valores[0] and _data_da_celula(valores[0][0]) is None:
+            cabecalho, inicio = valores[0], 1
+        else:
+            cabecalho, inicio = None, 0
+        colunas = max(len(linha) for linha in valores)
+
+        por_ano = {}
+        antigas_idx = []  # índices (base 0) das linhas da grade que saem da aba
+        for i in range(inicio, len(valores)):
+            linha = valores[i]
+            d = _data_da_celula(linha[0]) if linha else None
+            if d is not None and d < corte:
+                por_ano.setdefault(d.year, []).append(linha)
+                antigas_idx.append(i)
+
+        for ano, antigas in sorted(por_ano.items()):
+            ws_arquivo = _aba_de_arquivo(destino, f"{aba}_{ano}", cabecalho, colunas)
+            ws_arquivo.append_rows(antigas, value_input_option=raw)
+            print(f"   -> {len(antigas)} linhas de '{aba}' arquivadas em '{aba}_{ano}'.")
+
+        # O Sheets não deixa excluir todas as linhas não congeladas; garante uma sobrando
+        if len(antigas_idx) == len(valores) - inicio and ws.row_count <= len(valores):
+            ws.add_rows(1)
+
+        # Agrupa em blocos contíguos (normalmente um só, no topo de uma aba que só cresce)
+        blocos = []
+        for i in antigas_idx:
+            if blocos and blocos[-1][1] == i:
+                blocos[-1][1] = i + 1
+            else:
+                blocos.append([i, i + 1])
+
+        if len(blocos) == 1:
+            ws.delete_rows(blocos[0][0] + 1, blocos[0][1])
+        else:
+            # De baixo para cima, para os índices não se deslocarem; um batchUpdate é atômico
+            spreadsheet.batch_update({"requests": [
+                {"deleteDimension": {"range": {
+                    "sheetId": ws.id, "dimension": "ROWS",
+                    "startIndex": ini, "endIndex": fim
+                }}}
+                for ini, fim in reversed(blocos)
+            ]})
+
+def generate_history_report(spreadsheet, fonte):
     """Gera um arquivo TXT com o resumo dos últimos registros para contexto da IA."""
     print("\nGerando arquivo de histórico (Contexto)...")
     
@@ -399,25 +963,161 @@ def generate_history_report(spreadsheet, drive_service, folder_id):
     # CONVERTE PARA STRING
     content_str = "\n".join(report_lines)
 
-    # 4. SALVAR/ATUALIZAR NO DRIVE
-    file_name = "CONTEXTO_SAUDE_RECENTE.txt"
-    
-    # Verifica se o arquivo já existe para sobrescrever
-    query = f"name = '{file_name}' and '{folder_id}' in parents and trashed = false"
-    existing_files = drive_service.files().list(q=query).execute().get('files', [])
-
-    media = MediaIoBaseUpload(io.BytesIO(content_str.encode('utf-8')), mimetype='text/plain')
-
-    if existing_files:
-        # Atualiza o existente
-        file_id = existing_files[0]['id']
-        drive_service.files().update(fileId=file_id, media_body=media).execute()
-        print(f" -> Arquivo '{file_name}' ATUALIZADO com sucesso.")
-    else:
-        # Cria um novo
-        file_metadata = {'name': file_name, 'parents': [folder_id]}
-        drive_service.files().create(body=file_metadata, media_body=media).execute()
-        print(f" -> Arquivo '{file_name}' CRIADO com sucesso.")
+    # 4. SALVAR/ATUALIZAR NA FONTE (Drive ou pasta local)
+    fonte.salvar_texto("CONTEXTO_SAUDE_RECENTE.txt", content_str)
+
+# =========================
+# MOTOR ASSÍNCRONO (LISTAR -> BAIXAR -> TRANSFORMAR -> GRAVAR)
+# =========================
+# Cada estágio tem N workers e se liga ao próximo por uma fila limitada:
+# se a gravação no Sheets ficar lenta, as filas enchem e os downloads
+# esperam (backpressure) em vez de acumular tudo na memória. As chamadas
+# às APIs (bloqueantes) rodam em threads via asyncio.to_thread.
+
+_FIM = object()  # sentinela de fim de fila
+
+async def _estagio(entrada, saida, limite, trabalho):
+    """Roda `limite` workers consumindo `entrada` e entrega o resultado em `saida`."""
+    async def worker():
+        while True:
+            item = await entrada.get()
+            if item is _FIM:
+                await entrada.put(_FIM)  # repassa o fim para os outros workers
+                return
+            resultado = await trabalho(item)
+            if resultado is not None and saida is not None:
+                await saida.put(resultado)
+
+    async with asyncio.TaskGroup() as tg:
+        for _ in range(max(limite, 1)):
+            tg.create_task(worker())
+
+    if saida is not None:
+        await saida.put(_FIM)
+
+def _confirmar_arquivo(spreadsheet, fonte, arquivo, linhas):
+    """Grava as linhas, registra no log e move o arquivo (roda numa thread)."""
+    file_id = arquivo['id']
+    filename = arquivo['name']
+    print(f"\nProcessando: {filename} (ID: {file_id})...")
+
+    try:
+        # 3. Insere na planilha
+        gravar_linhas(spreadsheet, linhas)
+
+        # 4. Log
+        try:
+            spreadsheet.worksheet("log_json").append_row([
+                datetime.now().strftime("%Y-%m-%d"),
+                datetime.now().strftime("%H:%M:%S"),
+                filename,
+                file_id
+            ])
+        except:
+            pass
+
+        # 5. Move o arquivo para a pasta de processados
+        fonte.mover(arquivo)
+        print("   -> Arquivo movido para 'json_processados'.")
+        return True
+
+    except Exception as e:
+        print(f"ERRO ao processar {filename}: {e}")
+        return False
+
+async def executar_pipeline(spreadsheet, fonte, processed_ids):
+    """Processa todos os arquivos novos da fonte. Retorna (encontrados, processados).
+
+    Os arquivos são baixados e transformados fora de ordem, mas as gravações
+    começam na ordem da listagem. Com LIMITE_GRAVACOES=1 (padrão) elas também
+    terminam nessa ordem e as abas seguem cronológicas; com mais workers as
+    gravações se sobrepõem e podem terminar fora de ordem.
+    """
+    fila_arquivos = asyncio.Queue(TAMANHO_FILA)
+    fila_dados = asyncio.Queue(TAMANHO_FILA)
+    fila_linhas = asyncio.Queue(TAMANHO_FILA)
+    # Limita quantos arquivos podem estar "em voo" entre a listagem e a gravação
+    em_voo = asyncio.Semaphore(4 * TAMANHO_FILA)
+    pendentes = {}  # seq -> (file, linhas) aguardando a vez de gravar
+    estado = {"encontrados": 0, "processados": 0, "proximo": 0}
+
+    async def listar():
+        # 1. Percorre TODAS as páginas antes de soltar o primeiro arquivo: a gravação
+        # move arquivos para fora da pasta, e paginar a pasta enquanto ela encolhe
+        # poderia pular arquivos das páginas seguintes. A listagem só traz metadados.
+        paginas = fonte.paginas()
+        arquivos = []
+        while True:
+            pagina = await asyncio.to_thread(next, paginas, None)
+            if pagina is None:
+                break
+            arquivos.extend(pagina)
+
+        seq = 0
+        for file in arquivos:
+            estado["encontrados"] += 1
+            if file['id'] in processed_ids:
+                print(f" [PULADO] {file['name']} já foi processado (ID no log).")
+                continue
+            await em_voo.acquire()
+            await fila_arquivos.put((seq, file))
+            seq += 1
+        await fila_arquivos.put(_FIM)
+
+    async def baixar(item):
+        # 2. Lê o conteúdo direto da fonte (None = falhou, só ocupa a vez na gravação)
+        seq, file = item
+        try:
+            return seq, file, await asyncio.to_thread(fonte.ler, file)
+        except Exception as e:
+            print(f"ERRO ao processar {file['name']}: {e}")
+            return seq, file, None
+
+    async def transformar(item):
+        seq, file, data = item
+        if data is None:
+            return seq, file, None
+        try:
+            return seq, file, await asyncio.to_thread(montar_linhas, data, file['name'])
+        except Exception as e:
+            print(f"ERRO ao processar {file['name']}: {e}")
+            return seq, file, None
+
+    async def confirmar(file, linhas):
+        tarefa = asyncio.ensure_future(
+            asyncio.to_thread(_confirmar_arquivo, spreadsheet, fonte, file, linhas)
+        )
+        try:
+            ok = await asyncio.shield(tarefa)
+        except asyncio.CancelledError:
+            # Cancelado no meio da gravação: termina este arquivo (planilha + log + mover)
+            # antes de sair, para não deixar linhas gravadas sem registro no log.
+            await tarefa
+            raise
+        if ok:
+            estado["processados"] += 1
+
+    async def gravar(item):
+        seq, file, linhas = item
+        pendentes[seq] = (file, linhas)
+        # Grava tudo o que já pode sair em sequência; a vez é reservada sem await,
+        # então vários workers nunca pegam o mesmo arquivo.
+        while estado["proximo"] in pendentes:
+            file, linhas = pendentes.pop(estado["proximo"])
+            estado["proximo"] += 1
+            try:
+                if linhas is not None:
+                    await confirmar(file, linhas)
+            finally:
+                em_voo.release()
+
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(listar())
+        tg.create_task(_estagio(fila_arquivos, fila_dados, LIMITE_DOWNLOADS, baixar))
+        tg.create_task(_estagio(fila_dados, fila_linhas, LIMITE_TRANSFORMACOES, transformar))
+        tg.create_task(_estagio(fila_linhas, None, LIMITE_GRAVACOES, gravar))
+
+    return estado["encontrados"], estado["processados"]
 
 # =========================
 # MAIN
@@ -428,6 +1128,21 @@ def main():
     drive_service, creds = get_google_services()
     gc = gspread.authorize(creds)
     spreadsheet = gc.open_by_key(SPREADSHEET_ID)
+    fonte = criar_fonte(drive_service, creds)
+
+    # Mantém as abas "quentes" pequenas (linhas de anos anteriores vão para o arquivo)
+    if ARQUIVAR_ABAS:
+        print("Verificando abas para arquivamento...")
+        try:
+            corte = datetime.strptime(ARQUIVO_CORTE, "%Y-%m-%d").date() if ARQUIVO_CORTE else None
+        except ValueError:
+            print(f"[ERRO] ARQUIVO_CORTE inválido ('{ARQUIVO_CORTE}'), use AAAA-MM-DD. Arquivamento não executado.")
+        else:
+            try:
+                arquivo = gc.open_by_key(SPREADSHEET_ARQUIVO_ID) if SPREADSHEET_ARQUIVO_ID else None
+                arquivar_abas_antigas(spreadsheet, corte, arquivo)
+            except Exception as e:
+                print(f"Aviso: Arquivamento não concluído ({e}).")
 
     # --- NOVO: Carrega lista de IDs já processados ---
     print("Verificando histórico de logs...")
@@ -435,56 +1150,24 @@ def main():
     print(f"Histórico carregado: {len(processed_ids)} arquivos já processados anteriormente.")
     # -------------------------------------------------
 
-    # 1. Lista arquivos na nuvem
-    files = list_json_files_in_drive(drive_service, GDRIVE_INPUT_ID)
+    # 1-5. Lista, baixa, transforma, grava e move (estágios concorrentes)
+    try:
+        encontrados, processados = asyncio.run(executar_pipeline(spreadsheet, fonte, processed_ids))
+    except ExceptionGroup as grupo:
+        # O TaskGroup embrulha o erro; mostra o erro real (ex.: falha na listagem do Drive)
+        erro = grupo
+        while isinstance(erro, ExceptionGroup) and len(erro.exceptions) == 1:
+            erro = erro.exceptions[0]
+        raise erro from None
 
-    if not files:
+    if not encontrados:
         print("Nenhum arquivo JSON novo na pasta 'json_diarios'.")
         return
 
-    print(f"Encontrados {len(files)} arquivos para processar.")
-
-    for file in files:
-        file_id = file['id']
-        filename = file['name']
-
-        # --- NOVO: Checagem de Duplicidade ---
-        if file_id in processed_ids:
-            print(f" [PULADO] {filename} já foi processado (ID no log).")
-            # Opcional: Se quiser mover arquivos esquecidos na pasta de entrada, descomente abaixo:
-            # move_file_in_drive(drive_service, file_id, GDRIVE_INPUT_ID, GDRIVE_PROCESSED_ID)
-            continue
-        # -------------------------------------
-
-        print(f"\nProcessando: {filename} (ID: {file_id})...")
+    print(f"\n{processados} de {encontrados} arquivos encontrados foram processados.")
 
-        try:
-            # 2. Lê o conteúdo direto da nuvem
-            data = read_json_from_drive(drive_service, file_id)
-
-            # 3. Processa e insere na planilha
-            process_health_data(spreadsheet, data, filename)
-
-            # 4. Log
-            try:
-                spreadsheet.worksheet("log_json").append_row([
-                    datetime.now().strftime("%Y-%m-%d"),
-                    datetime.now().strftime("%H:%M:%S"),
-                    filename,
-                    file_id
-                ])
-            except:
-                pass
-
-            # 5. Move o arquivo DENTRO do Drive
-            move_file_in_drive(drive_service, file_id, GDRIVE_INPUT_ID, GDRIVE_PROCESSED_ID)
-            print("   -> Arquivo movido para 'json_processados'.")
-
-        except Exception as e:
-            print(f"ERRO ao processar {filename}: {e}")
-   
     # Gera o relatório de contexto sempre que rodar o script
-    generate_history_report(spreadsheet, drive_service, GDRIVE_KNOWLEDGE_ID)
+    generate_history_report(spreadsheet, fonte)
     
     print("\nProcessamento concluído.")
 
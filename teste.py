@@ -1,30 +1,12 @@
-import os
 import json
-from datetime import datetime
 
-PASTA_JSON = "json_diarios"
-
-def arquivo_dados_mais_recente():
-    prefixo = ["dados_", "analise_"]
-    arquivos = [
-        f for f in os.listdir(PASTA_JSON)
-            if f.startswith(item) and f.endswith(".json")
-    ]
-
-    if not arquivos:
-        raise FileNotFoundError("Nenhum arquivo dados_*.json encontrado")
+from inserir_planilha import FonteLocal
 
-    arquivos.sort(
-        key=lambda nome: datetime.strptime(
-            nome.replace(prefixo[item], "").replace(".json", ""),
-            "%Y-%m-%d"
-        )
-    )
-
-    return os.path.join(PASTA_JSON, arquivos[-1])
+PASTA_JSON = "json_diarios"
 
 # Uso
-caminho_dados = arquivo_dados_mais_recente()
+fonte = FonteLocal(PASTA_JSON)
+caminho_dados = fonte.mais_recente()["path"]
 
 print("Usando arquivo:", caminho_dados)
 